@@ -1,16 +1,25 @@
 import asyncio
 from collections import deque
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import difflib
+import errno
 import fnmatch
+import functools
+import inspect
+import io
+from itertools import islice
 from mcp.server import InitializationOptions, NotificationOptions, Server
 import mcp.server.stdio
 from mcp.types import Tool, TextContent
+from operator import attrgetter
 import os
 from pydantic import BaseModel, Field, ValidationError
 import re
+import shutil
+import stat
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple, Type
 
 
 # Custom error class
@@ -22,41 +31,113 @@ class CustomFileSystemError(ValueError):
 
 # Global mappings for directory access
 _allowed_real_dirs: List[str] = []  # Real file system paths
+_allowed_real_set: FrozenSet[str] = frozenset()  # Real paths, for exact matches
+_allowed_real_prefixes: Tuple[str, ...] = ()  # Real paths with trailing separator, longest first
 _virtual_to_real: Dict[str, str] = {}  # Virtual path -> Real path
 _real_to_virtual: Dict[str, str] = {}  # Real path -> Virtual path
+_allowed_real_ids: Dict[str, Optional[Tuple[int, int]]] = {}  # Real path -> (st_dev, st_ino) when configured
 
 
 def set_allowed_dirs(real_dirs: List[str]) -> None:
     """Configure allowed real directories and map them to virtual paths (e.g., /data/a)."""
-    global _allowed_real_dirs, _virtual_to_real, _real_to_virtual
-    _allowed_real_dirs = [os.path.abspath(os.path.expanduser(d)) for d in real_dirs]
+    global _allowed_real_dirs, _allowed_real_set, _allowed_real_prefixes, _virtual_to_real, _real_to_virtual, _allowed_real_ids
+    # Canonicalize once, so that paths below the allowed dirs only need their own components resolved
+    _allowed_real_dirs = [os.path.realpath(os.path.expanduser(d)) for d in real_dirs]
+    _allowed_real_set = frozenset(_allowed_real_dirs)
+    # A root such as "/" already ends with a separator; appending another one would make it unmatchable
+    _allowed_real_prefixes = tuple(sorted((d if d.endswith(os.sep) else d + os.sep for d in _allowed_real_dirs), key=len, reverse=True))
     _virtual_to_real = {f"/data/{chr(97 + i)}": real_dir for i, real_dir in enumerate(_allowed_real_dirs)}
     _real_to_virtual = {real_dir: virtual_dir for virtual_dir, real_dir in _virtual_to_real.items()}
+    _allowed_real_ids = {real_dir: _file_id(real_dir) for real_dir in _allowed_real_dirs}
+    map_virtual_path.cache_clear()
 
 
-def validate_virtual_path(virtual_path: str) -> str:
-    """Convert a virtual path to a real path, ensuring it’s within allowed directories."""
-    for virtual_dir, real_dir in _virtual_to_real.items():
-        if virtual_path.startswith(virtual_dir + "/") or virtual_path == virtual_dir:
-            relative = virtual_path[len(virtual_dir) :].lstrip("/")
-            real_path = os.path.join(real_dir, relative) if relative else real_dir
-            break
-    else:
+def _file_id(real_path: str) -> Optional[Tuple[int, int]]:
+    """Return (st_dev, st_ino) of a path without following a final symlink, or None if it cannot be read."""
+    try:
+        st = os.lstat(real_path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def _is_unchanged_root(real_dir: str) -> bool:
+    """Check that an allowed dir still is the directory that was canonicalized in set_allowed_dirs.
+
+    Replacing the dir or one of its ancestors with a symlink changes what its path refers to.
+    """
+    file_id = _file_id(real_dir)
+    return file_id is not None and file_id == _allowed_real_ids.get(real_dir)
+
+
+def _safe_join(real_dir: str, relative: str) -> str:
+    """Join a "/"-separated relative path onto a canonical real dir, resolving "." and ".." lexically.
+
+    Raises PermissionError if ".." would climb above real_dir.
+    """
+    if os.sep != "/":
+        relative = relative.replace(os.sep, "/")
+    parts: List[str] = []
+    for part in relative.split("/"):
+        if part == "..":
+            if not parts:
+                raise PermissionError("Access denied")
+            parts.pop()
+        elif part and part != ".":
+            parts.append(part)
+    if not parts:
+        return real_dir
+    # A root such as "/" already ends with a separator
+    return real_dir + ("" if real_dir.endswith(os.sep) else os.sep) + os.sep.join(parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def map_virtual_path(virtual_path: str) -> str:
+    """Map a virtual path to a normalized real path without touching the file system."""
+    # Virtual dirs always have the form /data/<letter>, so the first three components select the real dir
+    parts = virtual_path.split("/", 3)
+    real_dir = _virtual_to_real.get("/".join(parts[:3]))
+    if real_dir is None:
         raise CustomFileSystemError(f"Path must start with a virtual directory (e.g., /data/a): {virtual_path}")
+    # The real dirs are already canonical, so the relative part is all that needs normalizing
+    return _safe_join(real_dir, parts[3]) if len(parts) > 3 else real_dir
+
+
+def resolve_symlinks(real_path: str) -> str:
+    """Resolve symlinks in a normalized absolute path, like os.path.realpath but with fewer syscalls."""
+    if os.name != "posix":
+        return os.path.realpath(real_path)  # lstat does not report junctions and other reparse points
+    if real_path in _allowed_real_set:
+        return real_path if _is_unchanged_root(real_path) else os.path.realpath(real_path)
+    if not real_path.startswith(_allowed_real_prefixes):
+        return os.path.realpath(real_path)
+    # Prefixes are sorted longest first, so nested allowed dirs resolve from the innermost one.
+    # The allowed dir was canonical when configured, so as long as it has not been swapped out since,
+    # only the components below it can be symlinks.
+    prefix = next(p for p in _allowed_real_prefixes if real_path.startswith(p))
+    if not _is_unchanged_root(prefix if prefix in _allowed_real_set else prefix[: -len(os.sep)]):
+        return os.path.realpath(real_path)
+    path = prefix
+    for part in real_path[len(prefix) :].split(os.sep):
+        path = os.path.join(path, part)
+        try:
+            if stat.S_ISLNK(os.lstat(path).st_mode):
+                return os.path.realpath(real_path)
+        except OSError:
+            break  # Nothing below a missing component can be a symlink
+    return real_path
 
-    real_path = os.path.normpath(os.path.abspath(real_path))
-    try:
-        resolved_real_path = os.path.realpath(real_path)
-        if any(resolved_real_path.startswith(d + os.sep) or resolved_real_path == d for d in _allowed_real_dirs):
-            return resolved_real_path
-        raise PermissionError("Access denied")
-    except FileNotFoundError:
-        real_parent = os.path.realpath(os.path.dirname(real_path))
-        if not os.path.exists(real_parent):
-            raise FileNotFoundError("Parent directory not found")
-        if any(real_parent.startswith(d + os.sep) or real_parent == d for d in _allowed_real_dirs):
-            return real_path
-        raise PermissionError("Access denied")
+
+def validate_virtual_path(virtual_path: str) -> str:
+    """Convert a virtual path to a real path, ensuring it’s within allowed directories."""
+    # Only the pure string mapping is cached; symlinks are resolved on every call so that
+    # links created or changed after a first lookup can never be used to escape the allowed dirs.
+    # Missing trailing components are kept as they are (like a non-strict realpath), so new paths
+    # resolve in the same single pass and need no separate lookup of their parent
+    resolved_real_path = resolve_symlinks(map_virtual_path(virtual_path))
+    if resolved_real_path.startswith(_allowed_real_prefixes) or resolved_real_path in _allowed_real_set:
+        return resolved_real_path
+    raise PermissionError("Access denied")
 
 
 def get_error_message(message, virtual_path: str, e: Exception) -> str:
@@ -85,52 +166,369 @@ def get_error_message(message, virtual_path: str, e: Exception) -> str:
         return f"{message}: {virtual_path}"
 
 
+_LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+_TAIL_BLOCK_SIZE = 64 * 1024
+
+
 # File operation helpers
+def read_text_file(real_path: str) -> str:
+    """Read a whole UTF-8 file as bytes and decode it in one go, keeping line endings as stored."""
+    # Unbuffered FileIO.readall() sizes its buffer from fstat, so a regular file takes one data read() plus the EOF read
+    with open(real_path, "rb", buffering=0) as f:
+        return f.read().decode("utf-8")
+
+
+def _write_bytes(fd: int, data: memoryview) -> None:
+    """Write all of data to a raw file descriptor and close it."""
+    try:
+        while data:  # Usually a single write() call; loop in case of short writes
+            data = data[os.write(fd, data) :]
+    finally:
+        os.close(fd)
+
+
+def _overwrite_in_place(real_path: str, data: memoryview) -> None:
+    """Truncate and rewrite an existing file, keeping its inode."""
+    _write_bytes(os.open(real_path, os.O_WRONLY | os.O_TRUNC | getattr(os, "O_BINARY", 0)), data)
+
+
+def write_text_file(real_path: str, content: str) -> None:
+    """Atomically replace a file with UTF-8 content by writing a temporary file and renaming it over.
+
+    The replacement keeps the mode and group of the old file, but not its ACLs or extended attributes.
+    Files owned by another user or with several hard links, and files that cannot be replaced by a rename
+    (e.g. in read-only or sticky directories), are overwritten in place instead.
+    """
+    try:
+        st = os.stat(real_path)
+    except FileNotFoundError:
+        st = None  # New file: keep the umask-based default, as a plain open() would
+    # Renaming over the file would bypass its own permissions, so keep refusing read-only files
+    if st is not None and not os.access(real_path, os.W_OK):
+        raise PermissionError("Access denied")
+    data = memoryview(content.encode("utf-8"))
+    # A new inode would detach the other hard links, or take the file away from its owner
+    if st is not None and (st.st_nlink > 1 or (os.name == "posix" and st.st_uid != os.geteuid())):
+        _overwrite_in_place(real_path, data)
+        return
+    # Keep the temporary name short, so that names close to the length limit still work
+    tmp_path = os.path.join(os.path.dirname(real_path), f".{os.urandom(4).hex()}.tmp")
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    except OSError:
+        if st is None:
+            raise
+        # E.g. a writable file in a read-only directory
+        _overwrite_in_place(real_path, data)
+        return
+    try:
+        _write_bytes(fd, data)
+        if st is not None:
+            if os.name == "posix":
+                try:
+                    os.chown(tmp_path, -1, st.st_gid)
+                except OSError:
+                    pass  # The group can only be kept if we are a member of it
+            # chown() may clear the setuid/setgid bits, so restore the mode afterwards
+            os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        try:
+            os.replace(tmp_path, real_path)
+            return
+        except PermissionError:
+            if st is None:
+                raise
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # The directory does not allow replacing the file (EPERM/EACCES), so write it in place after all
+    _overwrite_in_place(real_path, data)
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass  # Append-only directories do not allow removing it either
+
+
 def head_file(real_path: str, lines: int) -> str:
     """Read first N lines of a file."""
-    with open(real_path, "r", encoding="utf-8") as f:
-        return "".join(line for i, line in enumerate(f) if i < lines)
+    with open(real_path, "r", encoding="utf-8", newline="") as f:
+        return "".join(islice(f, lines))
 
 
 def tail_file(real_path: str, lines: int) -> str:
-    """Read last N lines of a file."""
-    with open(real_path, "r", encoding="utf-8") as f:
-        return "".join(deque(f, maxlen=lines))
+    """Read last N lines of a file, reading blocks backwards from the end instead of the whole file."""
+    with open(real_path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # One more line break than requested lines guarantees that the last N lines are complete
+        while pos > 0 and newlines <= lines:
+            size = min(_TAIL_BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    data = b"".join(reversed(blocks))
+    if pos > 0:
+        data = data[data.index(b"\n") + 1 :]  # Drop the partial first line; cutting after b"\n" keeps UTF-8 intact
+    return "".join(deque(io.StringIO(data.decode("utf-8"), newline=""), maxlen=lines))
+
+
+def read_virtual_file(virtual_path: str) -> str:
+    """Validate a virtual path and read the whole file."""
+    return read_text_file(validate_virtual_path(virtual_path))
+
+
+def format_time(timestamp: float) -> str:
+    """Format a timestamp as local date and time."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def file_info(real_path: str) -> Dict[str, Any]:
+    """Get file metadata from a single stat call."""
+    stats = os.stat(real_path)
+    return {
+        "size": stats.st_size,
+        "created": format_time(stats.st_ctime),
+        "modified": format_time(stats.st_mtime),
+        "accessed": format_time(stats.st_atime),
+        "isDirectory": stat.S_ISDIR(stats.st_mode),
+        "isFile": stat.S_ISREG(stats.st_mode),
+        "permissions": format(stats.st_mode & 0o777, "03o"),
+    }
+
+
+def list_directory_entries(real_path: str) -> List[str]:
+    """List directory entries with [DIR]/[FILE] prefixes sorted by name, using the file types cached by scandir."""
+    with os.scandir(real_path) as it:
+        # Sort by name rather than by the formatted line, matching the sibling order of directory_tree
+        return [f"[{'DIR' if entry.is_dir() else 'FILE'}] {entry.name}" for entry in sorted(it, key=attrgetter("name"))]
+
+
+def _is_same_file(path1: str, path2: str) -> bool:
+    """Return whether both paths name the same file, without following symlinks."""
+    try:
+        return os.path.samestat(os.lstat(path1), os.lstat(path2))
+    except OSError:
+        return False
+
+
+def _is_same_entry(path1: str, path2: str) -> bool:
+    """Return whether both paths name the same directory entry, allowing for case-insensitive file systems.
+
+    Two hard links to one file are the same file, but different entries.
+    """
+    return (
+        os.path.basename(path1).casefold() == os.path.basename(path2).casefold()
+        and _is_same_file(os.path.dirname(path1), os.path.dirname(path2))
+        and _is_same_file(path1, path2)
+    )
+
+
+def move_path(real_source: str, real_destination: str) -> None:
+    """Move a file or directory without replacing an existing destination.
+
+    Moving a path onto itself (or a case-only rename on a case-insensitive file system) is passed to
+    rename(). Falls back to copy and delete across file systems.
+    """
+    if os.name == "posix" and not stat.S_ISDIR(os.lstat(real_source).st_mode):
+        # rename() would silently replace an existing file; link() refuses atomically, without a separate exists check
+        try:
+            os.link(real_source, real_destination, follow_symlinks=False)
+        except OSError as e:
+            if e.errno == errno.EEXIST and _is_same_entry(real_source, real_destination):
+                pass  # The destination is the source itself, so let rename() handle it
+            elif e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+                raise
+        else:
+            try:
+                os.unlink(real_source)
+            except BaseException:
+                os.unlink(real_destination)  # Undo the link, so that a failed move leaves only the source
+                raise
+            return
+    if os.path.lexists(real_destination) and not _is_same_entry(real_source, real_destination):
+        raise FileExistsError(real_destination)
+    try:
+        os.rename(real_source, real_destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # shutil copies file data inside the kernel where possible (os.sendfile on Linux)
+        if os.path.isdir(real_source):
+            shutil.copytree(real_source, real_destination, symlinks=True)
+            shutil.rmtree(real_source)
+        else:
+            shutil.copy2(real_source, real_destination, follow_symlinks=False)
+            os.unlink(real_source)
+
+
+def _edits_are_independent(edits: List[Dict[str, str]]) -> bool:
+    """Check that no edit can overlap another edit's matches or create new matches for a later edit."""
+    # Matches always span whole lines, so edits that share no line with each other cannot interact
+    old_lines = [set(_LINE_BREAK_RE.split(edit["oldText"])) for edit in edits]
+    new_lines = [set(_LINE_BREAK_RE.split(edit["newText"])) for edit in edits]
+    return not any(old_lines[j] & (old_lines[i] | new_lines[i]) for j in range(len(edits)) for i in range(j))
+
+
+def _format_hunk_range(start: int, stop: int) -> str:
+    """Format the 0-based line range [start, stop) for a unified diff hunk header."""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    # An empty range refers to the line before it
+    return f"{start + 1 if length else start},{length}"
+
+
+def _group_opcodes(opcodes: List[Tuple[str, int, int, int, int]], context: int):
+    """Group opcodes into hunks with up to context lines around each change, like SequenceMatcher.get_grouped_opcodes."""
+    if opcodes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if opcodes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        # Split at unchanged runs too long to serve as context for both neighbouring changes
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def diff_texts(virtual_path: str, content: str, new_content: str, context: int = 3) -> str:
+    """Return a unified diff of two texts, running the line matcher only on the region that changed."""
+    old_lines = content.splitlines(keepends=True)
+    new_lines = new_content.splitlines(keepends=True)
+    # Strip the common prefix and suffix before handing the rest to difflib, whose SequenceMatcher is
+    # quadratic in the worst case
+    limit = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    old_end = len(old_lines) - suffix
+    new_end = len(new_lines) - suffix
+    # With autojunk, lines that are frequent in larger inputs (blank lines, closing braces) are ignored
+    # as anchors, which can misalign the hunks
+    matcher = difflib.SequenceMatcher(None, old_lines[prefix:old_end], new_lines[prefix:new_end], autojunk=False)
+    opcodes = [(tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+    # The stripped prefix and suffix rejoin as unchanged runs, so hunk context is always taken from the
+    # full texts; context cut from the matcher's window could leave hunks that no longer apply
+    if prefix:
+        opcodes.insert(0, ("equal", 0, prefix, 0, prefix))
+    if suffix:
+        opcodes.append(("equal", old_end, len(old_lines), new_end, len(new_lines)))
+    if not opcodes:
+        return ""
+    # Emit the hunks directly, in the same format as difflib.unified_diff
+    out = []
+    for group in _group_opcodes(opcodes, context):
+        if not out:
+            out.append(f"--- {virtual_path}\n+++ {virtual_path}\n")
+        old_range = _format_hunk_range(group[0][1], group[-1][2])
+        new_range = _format_hunk_range(group[0][3], group[-1][4])
+        out.append(f"@@ -{old_range} +{new_range} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                out.extend(" " + line for line in old_lines[i1:i2])
+                continue
+            if tag != "insert":
+                out.extend("-" + line for line in old_lines[i1:i2])
+            if tag != "delete":
+                out.extend("+" + line for line in new_lines[j1:j2])
+    return "".join(out)
 
 
 def apply_edits(virtual_path: str, edits: List[Dict[str, str]], dry_run: bool) -> str:
     """Apply text replacements and return a diff."""
     real_path = validate_virtual_path(virtual_path)
-    with open(real_path, "r", encoding="utf-8") as f:
-        content = new_content = f.read()
-    for edit in edits:
-        pattern = rf"^{re.escape(edit['oldText'])}(\r?\n|\r|$)"
-        new_content = re.sub(pattern, lambda m: edit["newText"] + m.group(1), new_content, flags=re.MULTILINE)
-    diff = "".join(difflib.unified_diff(content.splitlines(keepends=True), new_content.splitlines(keepends=True), fromfile=virtual_path, tofile=virtual_path))
+    content = new_content = read_text_file(real_path)
+    if len(edits) > 1 and _edits_are_independent(edits):
+        # Apply all edits in a single pass; each alternative has one group, so lastindex identifies the edit
+        edits = [edit for edit in edits if edit["oldText"] in content]
+        pattern = "|".join(rf"^{re.escape(edit['oldText'])}(\r?\n|\r|$)" for edit in edits)
+        if pattern:
+            new_content = re.sub(pattern, lambda m: edits[m.lastindex - 1]["newText"] + m.group(m.lastindex), content, flags=re.MULTILINE)
+    else:
+        for edit in edits:
+            # Skip the regex pass (and the copy of the content) for text that does not occur at all
+            if edit["oldText"] not in new_content:
+                continue
+            pattern = rf"^{re.escape(edit['oldText'])}(\r?\n|\r|$)"
+            new_content = re.sub(pattern, lambda m: edit["newText"] + m.group(1), new_content, flags=re.MULTILINE)
+    if new_content == content:
+        return ""  # Nothing matched: no diff to compute and no need to rewrite the file
+    diff = diff_texts(virtual_path, content, new_content)
     if not dry_run:
-        with open(real_path, "w", encoding="utf-8") as f:
-            f.write(new_content)
+        write_text_file(real_path, new_content)
     return diff
 
 
+@functools.lru_cache(maxsize=512)
+def _compile_glob(*patterns: str) -> re.Pattern:
+    """Translate glob patterns into one compiled case-insensitive regex matching any of them (cached across calls)."""
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns), re.IGNORECASE)
+
+
+def _sorted_entries(real_dir: str) -> List[os.DirEntry]:
+    """Return the entries of real_dir sorted by name, with the directory handle already closed."""
+    with os.scandir(real_dir) as it:
+        return sorted(it, key=attrgetter("name"))
+
+
+def _scan_tree(real_dir: str, match: Optional[Callable[[str], Any]], exclude: Optional[Callable[[str], Any]]):
+    """Yield matching paths below real_dir depth-first, siblings sorted by name.
+
+    Paths are relative, "/"-separated, and directories have a trailing "/". The scan keeps an explicit
+    stack of sibling iterators instead of recursing, so deep trees cannot hit the recursion limit.
+    """
+    stack = [(iter(_sorted_entries(real_dir)), "")]
+    while stack:
+        entries, rel_dir = stack[-1]
+        for entry in entries:
+            name = entry.name
+            if exclude is not None and exclude(name):
+                continue  # Excluded directories are pruned here, before anything below them is read
+            rel_path = rel_dir + name
+            # DirEntry caches the file type from the directory read, so no extra stat is needed
+            is_dir = entry.is_dir()
+            if match is None or match(name):
+                yield rel_path + "/" if is_dir else rel_path
+            # Never descend into symlinked directories (like os.walk with followlinks=False)
+            if is_dir and not entry.is_symlink():
+                try:
+                    children = _sorted_entries(entry.path)
+                except OSError:
+                    continue  # Skip unreadable subdirectories, like os.walk does
+                # Descend now; the remaining siblings are resumed from this iterator afterwards
+                stack.append((iter(children), rel_path + "/"))
+                break
+        else:
+            stack.pop()
+
+
 def list_files_recursive(virtual_path: str, pattern: Optional[str] = None, exclude_patterns: Optional[List[str]] = None) -> str:
     """List files and directories recursively, optionally filtering by pattern."""
     real_path = validate_virtual_path(virtual_path)
-    matches = []
-    for root, dirs, files in os.walk(real_path):
-        # Apply exclusions only if there are patterns to exclude
-        if exclude_patterns:
-            dirs[:] = [d for d in dirs if not any(fnmatch.fnmatch(d, p) for p in exclude_patterns)]
-            files = [f for f in files if not any(fnmatch.fnmatch(f, p) for p in exclude_patterns)]
-        rel_root = os.path.relpath(root, real_path) if root != real_path else ""
-        # Collect matches
-        for name in dirs + files:
-            if pattern is None or fnmatch.fnmatch(name.lower(), pattern.lower()):
-                rel_path = os.path.join(rel_root, name).replace(os.sep, "/")
-                if os.path.isdir(os.path.join(root, name)):
-                    rel_path += "/"
-                matches.append(rel_path)
-    return "\n".join([f"### Contents of {virtual_path}:"] + sorted(matches))
+    # Pass bound match methods, so the per-entry checks skip the attribute lookup
+    match = _compile_glob(pattern).match if pattern is not None else None
+    # All exclude patterns are combined into one alternation, so each name is checked once
+    exclude = _compile_glob(*exclude_patterns).match if exclude_patterns else None
+    # Siblings are sorted during the depth-first scan, so the output needs no global sort
+    output = io.StringIO()
+    output.write(f"### Contents of {virtual_path}:")
+    for rel_path in _scan_tree(real_path, match, exclude):
+        output.write("\n")
+        output.write(rel_path)
+    return output.getvalue()
 
 
 # Tool argument models
@@ -179,6 +577,176 @@ class ListAllowedArgs(BaseModel):
     pass
 
 
+# Tool definitions, built once at import so list_tools does not regenerate the JSON schemas
+_TOOLS = [
+    Tool(
+        name="read_file",
+        description="Read file contents. Allows to head or tail the file. Limited to allowed dirs.",
+        inputSchema=ReadFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="read_multiple_files",
+        description="Read the contents of multiple files efficiently. Limited to allowed dirs.",
+        inputSchema=ReadMultipleArgs.model_json_schema(),
+    ),
+    Tool(
+        name="write_file",
+        description="Write or overwrite file with text content. Limited to allowed dirs.",
+        inputSchema=WriteFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="edit_file",
+        description="Edit file with line-based replacements, returns diff. Limited to allowed dirs.",
+        inputSchema=EditFileArgs.model_json_schema(),
+    ),
+    Tool(
+        name="create_directory",
+        description="Create directory, including nested ones. Limited to allowed dirs.",
+        inputSchema=DirArgs.model_json_schema(),
+    ),
+    Tool(
+        name="list_directory",
+        description="List files/dirs with [FILE]/[DIR] prefixes. Limited to allowed dirs.",
+        inputSchema=DirArgs.model_json_schema(),
+    ),
+    Tool(
+        name="directory_tree",
+        description="Show recursive directory listing. Limited to allowed dirs.",
+        inputSchema=DirArgs.model_json_schema(),
+    ),
+    Tool(
+        name="search_files",
+        description="Search files or directories by file name pattern. Limited to allowed dirs.",
+        inputSchema=SearchArgs.model_json_schema(),
+    ),
+    Tool(
+        name="move_file",
+        description="Move/rename file or directory. Fails if destination exists. Limited to allowed dirs.",
+        inputSchema=MoveArgs.model_json_schema(),
+    ),
+    Tool(
+        name="get_file_info",
+        description="Get file or directory metadata (size, times, permissions). Limited to allowed dirs.",
+        inputSchema=DirArgs.model_json_schema(),
+    ),
+    Tool(
+        name="list_allowed_directories",
+        description="List accessible directories. Use this once before trying to access files.",
+        inputSchema=ListAllowedArgs.model_json_schema(),
+    ),
+]
+
+
+# Tool handlers, registered by tool name
+_HANDLERS: Dict[str, Callable[[Dict[str, Any] | None], Awaitable[List[TextContent]]]] = {}
+
+
+def tool_handler(name: str, model: Type[BaseModel], error_message: str, path_field: str = "virtual_path"):
+    """Register a handler that gets validated arguments and returns the result text.
+
+    Synchronous handlers run in the default executor, so their blocking file I/O never stalls the event loop.
+    Any exception is turned into a user-friendly error message, naming the virtual path once it is known.
+    """
+
+    def decorator(func: Callable[[Any], str | Awaitable[str]]) -> Callable[[Any], str | Awaitable[str]]:
+        is_async = inspect.iscoroutinefunction(func)
+
+        async def handler(args: Dict[str, Any] | None) -> List[TextContent]:
+            a = None
+            try:
+                a = model.model_validate(args or {})
+                text = await func(a) if is_async else await asyncio.to_thread(func, a)
+                return [TextContent(type="text", text=text)]
+            except Exception as e:
+                return [TextContent(type="text", text=get_error_message(error_message, getattr(a, path_field, None), e))]
+
+        _HANDLERS[name] = handler
+        return func
+
+    return decorator
+
+
+@tool_handler("read_file", ReadFileArgs, "Error reading")
+def _read_file(a: ReadFileArgs) -> str:
+    real_path = validate_virtual_path(a.virtual_path)
+    if a.head is not None and a.tail is not None:
+        raise CustomFileSystemError("Specify either head or tail, not both")
+    if a.head is not None:
+        return head_file(real_path, a.head)
+    if a.tail is not None:
+        return tail_file(real_path, a.tail)
+    return read_text_file(real_path)
+
+
+@tool_handler("read_multiple_files", ReadMultipleArgs, "Error reading multiple files")
+async def _read_multiple_files(a: ReadMultipleArgs) -> str:
+    # Read all distinct files concurrently on the thread pool, keeping the requested order
+    unique_paths = list(dict.fromkeys(a.virtual_paths))
+    contents = await asyncio.gather(*(asyncio.to_thread(read_virtual_file, p) for p in unique_paths), return_exceptions=True)
+    results = []
+    for virtual_path, content in zip(unique_paths, contents):
+        if isinstance(content, Exception):
+            results.append(f"### {virtual_path}:\n{get_error_message('Error reading', virtual_path, content)}\n")
+        else:
+            results.append(f"### {virtual_path}:\n```\n{content}\n```\n")
+    return "\n".join(results)
+
+
+@tool_handler("write_file", WriteFileArgs, "Error writing")
+def _write_file(a: WriteFileArgs) -> str:
+    real_path = validate_virtual_path(a.virtual_path)
+    write_text_file(real_path, a.content)
+    return f"Wrote to {a.virtual_path}"
+
+
+@tool_handler("edit_file", EditFileArgs, "Error editing")
+def _edit_file(a: EditFileArgs) -> str:
+    return apply_edits(a.virtual_path, [{"oldText": e.oldText, "newText": e.newText} for e in a.edits], a.dryRun)
+
+
+@tool_handler("create_directory", DirArgs, "Error creating")
+def _create_directory(a: DirArgs) -> str:
+    real_path = validate_virtual_path(a.virtual_path)
+    os.makedirs(real_path, exist_ok=True)
+    return f"Created {a.virtual_path}"
+
+
+@tool_handler("list_directory", DirArgs, "Error listing")
+def _list_directory(a: DirArgs) -> str:
+    real_path = validate_virtual_path(a.virtual_path)
+    return "\n".join(list_directory_entries(real_path))
+
+
+@tool_handler("directory_tree", DirArgs, "Error listing")
+def _directory_tree(a: DirArgs) -> str:
+    return list_files_recursive(a.virtual_path)
+
+
+@tool_handler("search_files", SearchArgs, "Error searching")
+def _search_files(a: SearchArgs) -> str:
+    return list_files_recursive(a.virtual_path, a.pattern, a.excludePatterns)
+
+
+@tool_handler("move_file", MoveArgs, "Error moving", path_field="virtual_source")
+def _move_file(a: MoveArgs) -> str:
+    real_source = validate_virtual_path(a.virtual_source)
+    real_destination = validate_virtual_path(a.virtual_destination)
+    move_path(real_source, real_destination)
+    return f"Moved {a.virtual_source} to {a.virtual_destination}"
+
+
+@tool_handler("get_file_info", DirArgs, "Error getting info")
+def _get_file_info(a: DirArgs) -> str:
+    real_path = validate_virtual_path(a.virtual_path)
+    info = {"path": a.virtual_path, **file_info(real_path)}
+    return "\n".join(f"{k}: {v}" for k, v in info.items())
+
+
+@tool_handler("list_allowed_directories", ListAllowedArgs, "Error listing")
+async def _list_allowed_directories(a: ListAllowedArgs) -> str:
+    return "### Allowed directories:\n" + "\n".join(_virtual_to_real.keys())
+
+
 # Server setup
 server = Server("secure-filesystem-server")
 
@@ -186,206 +754,35 @@ server = Server("secure-filesystem-server")
 @server.list_tools()
 async def list_tools() -> List[Tool]:
     """List available tools, specifying virtual path inputs."""
-    return [
-        Tool(
-            name="read_file",
-            description="Read file contents. Allows to head or tail the file. Limited to allowed dirs.",
-            inputSchema=ReadFileArgs.schema(),
-        ),
-        Tool(
-            name="read_multiple_files",
-            description="Read the contents of multiple files efficiently. Limited to allowed dirs.",
-            inputSchema=ReadMultipleArgs.schema(),
-        ),
-        Tool(
-            name="write_file",
-            description="Write or overwrite file with text content. Limited to allowed dirs.",
-            inputSchema=WriteFileArgs.schema(),
-        ),
-        Tool(
-            name="edit_file",
-            description="Edit file with line-based replacements, returns diff. Limited to allowed dirs.",
-            inputSchema=EditFileArgs.schema(),
-        ),
-        Tool(
-            name="create_directory",
-            description="Create directory, including nested ones. Limited to allowed dirs.",
-            inputSchema=DirArgs.schema(),
-        ),
-        Tool(
-            name="list_directory",
-            description="List files/dirs with [FILE]/[DIR] prefixes. Limited to allowed dirs.",
-            inputSchema=DirArgs.schema(),
-        ),
-        Tool(
-            name="directory_tree",
-            description="Show recursive directory listing. Limited to allowed dirs.",
-            inputSchema=DirArgs.schema(),
-        ),
-        Tool(
-            name="search_files",
-            description="Search files or directories by file name pattern. Limited to allowed dirs.",
-            inputSchema=SearchArgs.schema(),
-        ),
-        Tool(
-            name="move_file",
-            description="Move/rename file or directory. Fails if destination exists. Limited to allowed dirs.",
-            inputSchema=MoveArgs.schema(),
-        ),
-        Tool(
-            name="get_file_info",
-            description="Get file or directory metadata (size, times, permissions). Limited to allowed dirs.",
-            inputSchema=DirArgs.schema(),
-        ),
-        Tool(
-            name="list_allowed_directories",
-            description="List accessible directories. Use this once before trying to access files.",
-            inputSchema=ListAllowedArgs.schema(),
-        ),
-    ]
+    return _TOOLS
 
 
 @server.call_tool()
 async def call_tool(name: str, args: Dict[str, Any] | None) -> List[TextContent]:
     """Execute tools, converting virtual paths to real paths and returning virtual paths in output."""
-    if name == "read_file":
-        try:
-            a = ReadFileArgs(**args)
-            real_path = validate_virtual_path(a.virtual_path)
-            if a.head is not None and a.tail is not None:
-                raise CustomFileSystemError("Specify either head or tail, not both")
-            if a.head is not None:
-                content = head_file(real_path, a.head)
-            elif a.tail is not None:
-                content = tail_file(real_path, a.tail)
-            else:
-                with open(real_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            return [TextContent(type="text", text=content)]
-        except Exception as e:
-            print(f"Debug: read_file error: type={type(e).__name__}, message={str(e)}")
-            return [TextContent(type="text", text=get_error_message("Error reading", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "read_multiple_files":
-        try:
-            a = ReadMultipleArgs(**args)
-            results = []
-            seen = set()
-            for virtual_path in a.virtual_paths:
-                if virtual_path not in seen:
-                    try:
-                        seen.add(virtual_path)
-                        real_path = validate_virtual_path(virtual_path)
-                        content = open(real_path, "r", encoding="utf-8").read()
-                        results.append(f"### {virtual_path}:\n```\n{content}\n```\n")
-                    except Exception as e:
-                        results.append(f"### {virtual_path}:\n{get_error_message('Error reading', virtual_path, e)}\n")
-            return [TextContent(type="text", text="\n".join(results))]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error reading multiple files", None, e))]
-
-    elif name == "write_file":
-        try:
-            a = WriteFileArgs(**args)
-            real_path = validate_virtual_path(a.virtual_path)
-            open(real_path, "w", encoding="utf-8").write(a.content)
-            return [TextContent(type="text", text=f"Wrote to {a.virtual_path}")]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error writing", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "edit_file":
-        try:
-            a = EditFileArgs(**args)
-            diff = apply_edits(a.virtual_path, [{"oldText": e.oldText, "newText": e.newText} for e in a.edits], a.dryRun)
-            return [TextContent(type="text", text=diff)]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error editing", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "create_directory":
-        try:
-            a = DirArgs(**args)
-            real_path = validate_virtual_path(a.virtual_path)
-            os.makedirs(real_path, exist_ok=True)
-            return [TextContent(type="text", text=f"Created {a.virtual_path}")]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error creating", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "list_directory":
-        try:
-            a = DirArgs(**args)
-            real_path = validate_virtual_path(a.virtual_path)
-            entries = os.listdir(real_path)
-            listing = [f"[{'DIR' if os.path.isdir(os.path.join(real_path, e)) else 'FILE'}] {e}" for e in entries]
-            return [TextContent(type="text", text="\n".join(listing))]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error listing", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "directory_tree":
-        try:
-            a = DirArgs(**args)
-            return [TextContent(type="text", text=list_files_recursive(a.virtual_path))]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error listing", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "search_files":
-        try:
-            a = SearchArgs(**args)
-            return [TextContent(type="text", text=list_files_recursive(a.virtual_path, a.pattern, a.excludePatterns))]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error searching", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "move_file":
-        try:
-            a = MoveArgs(**args)
-            real_source = validate_virtual_path(a.virtual_source)
-            real_destination = validate_virtual_path(a.virtual_destination)
-            os.rename(real_source, real_destination)
-            return [TextContent(type="text", text=f"Moved {a.virtual_source} to {a.virtual_destination}")]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error moving", None if "a" not in locals() else a.virtual_source, e))]
-
-    elif name == "get_file_info":
-        try:
-
-            def format_time(timestamp):
-                return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-
-            a = DirArgs(**args)
-            real_path = validate_virtual_path(a.virtual_path)
-            stats = os.stat(real_path)
-            info = {
-                "path": a.virtual_path,
-                "size": stats.st_size,
-                "created": format_time(stats.st_ctime),
-                "modified": format_time(stats.st_mtime),
-                "accessed": format_time(stats.st_atime),
-                "isDirectory": os.path.isdir(real_path),
-                "isFile": os.path.isfile(real_path),
-                "permissions": oct(stats.st_mode)[-3:],
-            }
-            return [TextContent(type="text", text="\n".join(f"{k}: {v}" for k, v in info.items()))]
-        except Exception as e:
-            return [TextContent(type="text", text=get_error_message("Error getting info", None if "a" not in locals() else a.virtual_path, e))]
-
-    elif name == "list_allowed_directories":
-        return [TextContent(type="text", text="### Allowed directories:\n" + "\n".join(_virtual_to_real.keys()))]
-
-    return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    handler = _HANDLERS.get(name)
+    if handler is None:
+        return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    return await handler(args)
 
 
 async def main() -> None:
     """Run the server with allowed directories from command-line arguments."""
     if len(sys.argv) < 2:
-        print("Usage: filesystem <allowed-directory> [additional-directories...]")
+        print("Usage: filesystem <allowed-directory> [additional-directories...]", file=sys.stderr)
         sys.exit(1)
     real_dirs = sys.argv[1:]
     for real_dir in real_dirs:
         if not os.path.isdir(real_dir):
-            print(f"Error: {real_dir} is not a directory")
+            print(f"Error: {real_dir} is not a directory", file=sys.stderr)
             sys.exit(1)
     set_allowed_dirs(real_dirs)
     virtual_dirs_mapping = "\n".join(f"{v} -> {r}" for v, r in _virtual_to_real.items())
-    print(f"MCP Filesystem Server running on stdio\nVirtual to real directory mappings:\n{virtual_dirs_mapping}")
+    # stdout carries the JSON-RPC stream, so anything else has to go to stderr
+    print(f"MCP Filesystem Server running on stdio\nVirtual to real directory mappings:\n{virtual_dirs_mapping}", file=sys.stderr)
+    # File operations are I/O-bound, so allow more blocking calls in flight than the default executor does
+    max_workers = int(os.environ.get("FS_THREADS", "64"))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fs-io"))
     async with mcp.server.stdio.stdio_server() as (read, write):
         await server.run(
             read,
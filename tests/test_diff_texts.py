@@ -0,0 +1,46 @@
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from filesystem.server import diff_texts
+
+pytestmark = pytest.mark.skipif(shutil.which("patch") is None, reason="needs the patch tool")
+
+
+def apply_with_patch(tmp_path, old: str, diff: str) -> str:
+    """Apply a diff with GNU patch, without fuzz, and return the patched text."""
+    (tmp_path / "f").write_bytes(old.encode())
+    subprocess.run(["patch", "-s", "-F0", "-p0", "--no-backup-if-mismatch", "-r", "-"], input=diff, cwd=tmp_path, check=True, text=True)
+    return (tmp_path / "f").read_bytes().decode()
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("b\nc\n}\n\n}\n", "b\nc\n}\n\n\n}\n"),
+        ("b\n\n\n\n\n\n", "b\n\n}\n\n\n\n\n"),
+        ("b\n\n\nb\n\n\n", "b\n\nb\n\nb\n\n\n"),
+        ("", "a\n"),
+        ("a\n", ""),
+    ],
+)
+def test_diff_applies_with_full_context(tmp_path, old, new):
+    assert apply_with_patch(tmp_path, old, diff_texts("f", old, new)) == new
+
+
+def test_random_edits_apply(tmp_path):
+    rng = random.Random(1)
+    lines = ["a\n", "b\n", "}\n", "\n", "x = 1\n"]
+    for _ in range(300):
+        old = rng.choices(lines, k=rng.randint(0, 30))
+        new = list(old)
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randint(0, len(new))
+            new[i:i] = rng.choices(lines, k=rng.randint(1, 3))
+            if new and rng.random() < 0.5:
+                del new[rng.randrange(len(new))]
+        old_text, new_text = "".join(old), "".join(new)
+        if old_text != new_text:
+            assert apply_with_patch(tmp_path, old_text, diff_texts("f", old_text, new_text)) == new_text